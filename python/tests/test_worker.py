@@ -0,0 +1,392 @@
+import base64
+import importlib.util
+import io
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+
+WORKER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "worker.py")
+
+
+class FakeTokenizer:
+    def __init__(self, language_code):
+        self.language_code = language_code
+
+
+class FakeWhisperXPipeline:
+    # Mirrors whisperx.asr.FasterWhisperPipeline: a transcribe call with a
+    # language pins self.tokenizer, and later calls fall back to it.
+    def __init__(self, language=None):
+        self.tokenizer = FakeTokenizer(language) if language else None
+
+    def detect_language(self, audio):
+        return "pt"
+
+    def transcribe(self, audio, language=None, **kwargs):
+        if self.tokenizer is None:
+            language = language or self.detect_language(audio)
+            self.tokenizer = FakeTokenizer(language)
+        language = language or self.tokenizer.language_code
+        return {"segments": [], "language": language}
+
+
+class FakeTorch(types.ModuleType):
+    def __init__(self):
+        super().__init__("torch")
+        self.threads = 8
+
+    def get_num_threads(self):
+        return self.threads
+
+    def set_num_threads(self, threads):
+        self.threads = threads
+
+
+class FakeFasterWhisperModel:
+    live = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self, model_name, **kwargs):
+        if model_name == "bad":
+            raise RuntimeError("no such model")
+        self.kwargs = kwargs
+        with FakeFasterWhisperModel.lock:
+            FakeFasterWhisperModel.live += 1
+            FakeFasterWhisperModel.peak = max(FakeFasterWhisperModel.peak, FakeFasterWhisperModel.live)
+        time.sleep(0.02)
+
+    def __del__(self):
+        with FakeFasterWhisperModel.lock:
+            FakeFasterWhisperModel.live -= 1
+
+
+def install_fake_engines():
+    sys.modules["torch"] = FakeTorch()
+    faster_whisper = types.ModuleType("faster_whisper")
+    faster_whisper.WhisperModel = FakeFasterWhisperModel
+    sys.modules["faster_whisper"] = faster_whisper
+    whisper = types.ModuleType("whisper")
+    whisper.load_model = lambda name, device=None, download_root=None: object()
+    sys.modules["whisper"] = whisper
+    whisperx = types.ModuleType("whisperx")
+    whisperx.load_model = lambda name, device, compute_type, language=None, threads=4: FakeWhisperXPipeline(language)
+    whisperx.load_audio = lambda path: b""
+    sys.modules["whisperx"] = whisperx
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        numpy = types.ModuleType("numpy")
+        numpy.float32 = "float32"
+        numpy.zeros = lambda size, dtype=None: [0.0] * size
+        sys.modules["numpy"] = numpy
+
+
+def load_worker():
+    install_fake_engines()
+    spec = importlib.util.spec_from_file_location("tray_worker", WORKER_PATH)
+    worker = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(worker)
+    return worker
+
+
+class WarmupTests(unittest.TestCase):
+    def setUp(self):
+        self.worker = load_worker()
+        self.worker.WARMUP_INFER = True
+
+    def test_whisperx_without_language_still_auto_detects_after_cuda_warmup(self):
+        model, _lock = self.worker.load_model_cached("small", "cuda", "int8", None, "whisperx")
+        self.assertIsNone(model.tokenizer)
+        self.assertEqual(model.transcribe(b"audio")["language"], "pt")
+
+
+class TorchThreadTests(unittest.TestCase):
+    def setUp(self):
+        self.worker = load_worker()
+        self.worker.WARMUP_INFER = False
+        self.torch = sys.modules["torch"]
+
+    def test_ct2_engines_limit_torch_threads(self):
+        self.worker.load_model_cached("small", "cpu", "int8", None, "faster-whisper")
+        self.assertEqual(self.torch.threads, self.worker.TORCH_NUM_THREADS)
+
+    def test_whisper_keeps_default_torch_threads_alongside_ct2_engines(self):
+        self.worker.load_model_cached("small", "cpu", "int8", None, "faster-whisper")
+        self.worker.load_model_cached("small", "cpu", "int8", None, "whisper")
+        self.assertEqual(self.torch.threads, 8)
+        self.worker.load_model_cached("base", "cpu", "int8", None, "faster-whisper")
+        self.assertEqual(self.torch.threads, 8)
+
+
+class ModelCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.worker = load_worker()
+        FakeFasterWhisperModel.live = 0
+        FakeFasterWhisperModel.peak = 0
+
+    def test_concurrent_loads_keep_at_most_cap_models_resident(self):
+        def load(name):
+            self.worker.load_model_cached(name, "cpu", "int8", None, "faster-whisper")
+
+        threads = [threading.Thread(target=load, args=(f"model-{i}",)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.worker.model_cache), self.worker.MAX_CACHED_MODELS)
+        self.assertLessEqual(FakeFasterWhisperModel.peak, self.worker.MAX_CACHED_MODELS)
+
+    def test_full_cache_evicts_before_loading_a_new_model(self):
+        for i in range(self.worker.MAX_CACHED_MODELS):
+            self.worker.load_model_cached(f"model-{i}", "cpu", "int8", None, "faster-whisper")
+        self.worker.load_model_cached("new", "cpu", "int8", None, "faster-whisper")
+        self.assertEqual(FakeFasterWhisperModel.peak, self.worker.MAX_CACHED_MODELS)
+        self.assertIn("new", [key[1] for key in self.worker.model_cache])
+        self.assertNotIn("model-0", [key[1] for key in self.worker.model_cache])
+
+    def test_concurrent_loads_of_one_key_load_it_once(self):
+        entries = []
+
+        def load():
+            entries.append(self.worker.load_model_cached("small", "cpu", "int8", None, "faster-whisper"))
+
+        threads = [threading.Thread(target=load) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(entry[0]) for entry in entries}), 1)
+
+    def test_failed_load_does_not_block_later_loads(self):
+        with self.assertRaises(RuntimeError):
+            self.worker.load_model_cached("bad", "cpu", "int8", None, "faster-whisper")
+        self.worker.load_model_cached("small", "cpu", "int8", None, "faster-whisper")
+        self.assertIn("small", [key[1] for key in self.worker.model_cache])
+
+class PreloadTests(unittest.TestCase):
+    def setUp(self):
+        self.worker = load_worker()
+        self.worker.MAX_CACHED_MODELS = 2
+
+    def test_failed_and_duplicate_entries_do_not_use_capacity(self):
+        entries = [{"engine": "faster-whisper", "model": name} for name in ("a", "bad", "a", "c", "d")]
+        entries.insert(1, 5)
+        result = self.worker.preload_payload({"models": entries})
+        outcomes = [(item["model"], item["ok"], item.get("error", "")[:8]) for item in result["results"]]
+        self.assertEqual(
+            outcomes,
+            [
+                ("a", True, ""),
+                (None, False, "invalid "),
+                ("bad", False, "model lo"),
+                ("a", True, ""),
+                ("c", True, ""),
+                ("d", False, "skipped:"),
+            ],
+        )
+        self.assertEqual(sorted(key[1] for key in self.worker.model_cache), ["a", "c"])
+
+
+class Base64DecodeTests(unittest.TestCase):
+    def setUp(self):
+        self.worker = load_worker()
+        self.data = bytes(range(256)) * 3 + b"tail"
+
+    def decode(self, audio_b64, chunk_chars):
+        self.worker.BASE64_CHUNK_CHARS = chunk_chars
+        out = io.BytesIO()
+        self.worker.write_base64_to_file(out, audio_b64)
+        return out.getvalue()
+
+    def test_sliced_decode_matches_one_shot_decode(self):
+        plain = base64.b64encode(self.data).decode()
+        inputs = {
+            "plain": plain,
+            "wrapped": base64.encodebytes(self.data).decode(),
+            "spaced": " ".join(plain[i : i + 5] for i in range(0, len(plain), 5)),
+        }
+        for name, audio_b64 in inputs.items():
+            for chunk_chars in (4, 8, 64, 76):
+                with self.subTest(input=name, chunk_chars=chunk_chars):
+                    self.assertEqual(self.decode(audio_b64, chunk_chars), base64.b64decode(audio_b64))
+                    self.assertEqual(self.decode(audio_b64, chunk_chars), self.data)
+
+    def test_clean_input_skips_the_filtering_path(self):
+        class NoFilter:
+            def sub(self, repl, string):
+                raise AssertionError("filtering path used for clean input")
+
+        self.worker.BASE64_JUNK_RE = NoFilter()
+        audio_b64 = base64.b64encode(self.data).decode()
+        self.assertEqual(self.decode(audio_b64, 64), self.data)
+
+
+class TempAudioPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.worker = load_worker()
+        self.addCleanup(self.worker.cleanup_temp_audio)
+
+    def test_pool_keeps_at_most_pool_size_empty_files(self):
+        workers = self.worker.TEMP_POOL_SIZE * 2
+        barrier = threading.Barrier(workers)
+        paths = []
+        paths_lock = threading.Lock()
+
+        def request():
+            path = self.worker.write_temp_audio(".wav", lambda f: f.write(b"audio"))
+            with paths_lock:
+                paths.append(path)
+            barrier.wait()
+            self.worker.release_temp_audio(path)
+
+        threads = [threading.Thread(target=request) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(paths)), workers)
+        free = self.worker._tmp_free[".wav"]
+        self.assertEqual(len(free), self.worker.TEMP_POOL_SIZE)
+        self.assertEqual(sorted(os.listdir(self.worker._tmp_dir)), sorted(os.path.basename(p) for p in free))
+        for path in free:
+            self.assertEqual(os.path.getsize(path), 0)
+        pooled = list(free)
+        self.assertIn(self.worker.acquire_temp_audio(".wav"), pooled)
+
+    def test_invalid_base64_is_reported_as_such(self):
+        with self.assertRaisesRegex(RuntimeError, "invalid base64"):
+            self.worker.transcribe_payload({"audio_base64": "A", "extension": ".wav"})
+
+    def test_filesystem_errors_are_not_reported_as_invalid_base64(self):
+        missing_dir = os.path.join(tempfile.gettempdir(), "tray-transcriber-missing-dir")
+        self.worker.acquire_temp_audio = lambda extension: os.path.join(missing_dir, "audio.wav")
+        with self.assertRaises(FileNotFoundError):
+            self.worker.transcribe_payload({"audio_base64": "AAAA", "extension": ".wav"})
+        self.assertNotIn(os.path.join(missing_dir, "audio.wav"), self.worker._tmp_free.get(".wav", []))
+
+    def test_removed_temp_dir_is_recreated(self):
+        self.worker.transcribe_file = lambda path, payload: {"ok": True, "path": path}
+        payload = {"audio_base64": "AAAA", "extension": ".wav"}
+        first = self.worker.transcribe_payload(payload)["path"]
+        shutil.rmtree(self.worker._tmp_dir)
+        for _ in range(2):
+            path = self.worker.transcribe_payload(payload)["path"]
+            self.assertNotEqual(os.path.dirname(path), os.path.dirname(first))
+            self.assertTrue(os.path.isdir(os.path.dirname(path)))
+
+
+class HttpTests(unittest.TestCase):
+    def setUp(self):
+        self.worker = load_worker()
+
+        class QuietHandler(self.worker.WhisperXHandler):
+            def log_message(self, format, *args):
+                pass
+
+        self.server = self.worker.ThreadingHTTPServer(("127.0.0.1", 0), QuietHandler)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def send_raw(self, request, half_close=False):
+        with socket.create_connection(self.server.server_address, timeout=5) as sock:
+            sock.sendall(request)
+            if half_close:
+                sock.shutdown(socket.SHUT_WR)
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+    def test_chunked_post_is_refused_and_connection_closed(self):
+        body = b'{"audio_base64": "AAAA"}'
+        request = (
+            b"POST /transcribe HTTP/1.1\r\nHost: localhost\r\nTransfer-Encoding: chunked\r\n\r\n"
+            + f"{len(body):x}\r\n".encode()
+            + body
+            + b"\r\n0\r\n\r\n"
+        )
+        response = self.send_raw(request)
+        self.assertTrue(response.startswith(b"HTTP/1.1 411"))
+        self.assertIn(b"Connection: close", response)
+        self.assertEqual(response.count(b"HTTP/1."), 1)
+
+    def test_truncated_raw_upload_is_not_transcribed(self):
+        calls = []
+        self.worker.transcribe_file = lambda path, payload: calls.append(path) or {"ok": True, "result": {}}
+        response = self.send_raw(
+            b"POST /transcribe_raw HTTP/1.1\r\nHost: localhost\r\nContent-Length: 100\r\n\r\n" + b"x" * 10,
+            half_close=True,
+        )
+        self.assertTrue(response.startswith(b"HTTP/1.1 400"))
+        self.assertIn(b"body truncated", response)
+        self.assertEqual(calls, [])
+
+    def test_client_connection_close_is_honoured(self):
+        response = self.send_raw(b"GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 200"))
+        self.assertIn(b"Connection: close", response)
+
+    def test_transcribe_rejects_path_over_http(self):
+        calls = []
+        self.worker.transcribe_file = lambda path, payload: calls.append(path) or {"ok": True, "result": {}}
+        body = json.dumps({"path": __file__}).encode()
+        response = self.send_raw(
+            b"POST /transcribe HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        self.assertTrue(response.startswith(b"HTTP/1.1 400"))
+        self.assertIn(b"path is only accepted over stdio", response)
+        self.assertEqual(calls, [])
+
+
+class StdioPathTests(unittest.TestCase):
+    def setUp(self):
+        self.worker = load_worker()
+        self.calls = []
+        self.worker.transcribe_file = lambda path, payload: self.calls.append(path) or {
+            "ok": True,
+            "result": {"text": "hi"},
+        }
+
+    def run_stdio(self, *messages):
+        out = []
+        self.worker.emit_stdout = out.append
+        stdin = sys.stdin
+        sys.stdin = io.StringIO("".join(json.dumps(msg) + "\n" for msg in messages))
+        try:
+            self.worker.run_stdio()
+        finally:
+            sys.stdin = stdin
+        return [msg for msg in out if "id" in msg]
+
+    def test_existing_path_is_transcribed(self):
+        with tempfile.NamedTemporaryFile(suffix=".wav") as f:
+            replies = self.run_stdio({"id": 1, "type": "transcribe", "payload": {"path": f.name}})
+        self.assertEqual(replies, [{"id": 1, "ok": True, "result": {"text": "hi"}}])
+        self.assertEqual(self.calls, [f.name])
+
+    def test_missing_path_is_rejected(self):
+        missing = os.path.join(tempfile.gettempdir(), "tray-transcriber-missing.wav")
+        replies = self.run_stdio({"id": 1, "type": "transcribe", "payload": {"path": missing}})
+        self.assertFalse(replies[0]["ok"])
+        self.assertIn("audio file not found", replies[0]["error"])
+        self.assertEqual(self.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,17 +1,36 @@
 #!/usr/bin/env python3
 import argparse
-import base64
+import atexit
 import importlib
+import inspect
+import itertools
 import json
+import mmap
 import os
+import re
+import shutil
+import signal
 import sys
 import threading
 import tempfile
 import time
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from collections import OrderedDict
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+try:
+    import pybase64  # type: ignore
+except ImportError:
+    import base64 as pybase64
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
 
 base_whisper = None
-model_cache = {}
+model_cache = OrderedDict()
 model_lock = threading.Lock()
 last_error = None
 last_load_model = None
@@ -19,75 +38,192 @@ last_load_ms = None
 last_transcribe_ms = None
 loading_model = None
 loading_started_at = None
-whisper_module = None
-
-
-LOG_LEVELS = {"silent": 0, "error": 1, "info": 2, "debug": 3}
+_default_device = None
+_engine_modules = {}
+_load_audio_fn = None
+_prompt_kw_cache = {}
+BASE64_CHUNK_CHARS = 65536 * 4
+BASE64_JUNK_RE = re.compile(r"[^A-Za-z0-9+/=]")
+BODY_READ_CHUNK_BYTES = 65536
+BODY_SPOOL_MAX_BYTES = 1 << 20
+KEEPALIVE_TIMEOUT_S = 60
+TEMP_EXTENSION_RE = re.compile(r"^\.[A-Za-z0-9]{1,10}$")
+_tmp_dir = None
+TEMP_POOL_SIZE = 4
+_tmp_free = {}
+_tmp_counter = itertools.count()
+_tmp_paths_lock = threading.Lock()
+RAW_PARAM_FIELDS = ("engine", "model", "language", "compute_type", "batch_size", "initial_prompt", "device", "extension")
+
+
+LOG_SILENT = 0
+LOG_ERROR = 1
+LOG_INFO = 2
+LOG_DEBUG = 3
+LOG_LEVELS = {"silent": LOG_SILENT, "error": LOG_ERROR, "info": LOG_INFO, "debug": LOG_DEBUG}
+_LEVEL_TAGS = {level: name.upper() for name, level in LOG_LEVELS.items()}
+_ts_cache = (0, "")
 _log_level_name = os.environ.get("TRANSCRIBER_LOG_LEVEL", "error").lower()
-_log_level = LOG_LEVELS.get(_log_level_name, 1)
+_log_level = LOG_LEVELS.get(_log_level_name, LOG_ERROR)
+# Lets per-request call sites skip building messages that would be dropped.
+INFO_ENABLED = _log_level >= LOG_INFO
 _log_path = os.environ.get("TRANSCRIBER_LOG_PATH")
+_log_lock = threading.Lock()
+_log_file = None
+if _log_path:
+    try:
+        _log_file = open(_log_path, "ab")
+    except Exception:
+        _log_file = None
+STDOUT_FD = 1
+STDERR_FD = 2
 
 
-def log(level, message):
-    if LOG_LEVELS.get(level, 0) > _log_level:
-        return
-    line = f"[{time.strftime('%Y-%m-%dT%H:%M:%S')}] [{level.upper()}] {message}"
+def env_int(name, default, minimum=None):
     try:
-        sys.stderr.write(line + "\n")
-        sys.stderr.flush()
-    except Exception:
+        value = int(os.environ.get(name, default))
+    except ValueError:
+        value = default
+    if minimum is not None and value < minimum:
+        value = minimum
+    return value
+
+
+MAX_CACHED_MODELS = env_int("TRANSCRIBER_MAX_CACHED_MODELS", 2, minimum=1)
+# Serializes model loads so at most MAX_CACHED_MODELS models are resident.
+_load_slot = threading.Lock()
+CT2_CPU_THREADS = env_int("CT2_CPU_THREADS", max(1, (os.cpu_count() or 2) // 2), minimum=1)
+CT2_NUM_WORKERS = env_int("CT2_NUM_WORKERS", 1, minimum=1)
+TORCH_NUM_THREADS = env_int("TORCH_NUM_THREADS", 1, minimum=1)
+_torch_default_threads = None
+WARMUP_INFER = os.environ.get("TRANSCRIBER_WARMUP_INFER", "1") != "0"
+WARMUP_SAMPLES = 16000
+# Optional persistent directory for model weights. Set before any engine
+# import so huggingface_hub picks up HF_HOME; an existing HF_HOME wins.
+MODEL_DIR = os.environ.get("TRANSCRIBER_MODEL_DIR") or None
+if MODEL_DIR:
+    MODEL_DIR = os.path.abspath(os.path.expanduser(MODEL_DIR))
+    try:
+        os.makedirs(MODEL_DIR, exist_ok=True)
+    except OSError:
         pass
-    if _log_path:
+    os.environ.setdefault("HF_HOME", os.path.join(MODEL_DIR, "huggingface"))
+
+
+def write_fd(fd, data):
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def now_ts():
+    # Log bursts land in the same second; format the timestamp once per second.
+    global _ts_cache
+    second = int(time.time())
+    cached = _ts_cache
+    if second != cached[0]:
+        cached = (second, time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(second)))
+        _ts_cache = cached
+    return cached[1]
+
+
+def log(level, message):
+    if level > _log_level:
+        return
+    line = f"[{now_ts()}] [{_LEVEL_TAGS[level]}] {message}\n".encode("utf-8", "replace")
+    with _log_lock:
         try:
-            with open(_log_path, "a", encoding="utf-8") as f:
-                f.write(line + "\n")
+            write_fd(STDERR_FD, line)
         except Exception:
             pass
+        if _log_file is not None:
+            try:
+                _log_file.write(line)
+                _log_file.flush()
+            except Exception:
+                pass
+
+
+def import_engine_module(name):
+    # Memoized so requests skip importlib and its import lock once an engine
+    # module has been resolved. Failed imports are not cached.
+    mod = _engine_modules.get(name)
+    if mod is None:
+        mod = importlib.import_module(name)
+        _engine_modules[name] = mod
+    return mod
 
 
 def detect_whisper_module():
     for name in ("whisperx", "whisper", "faster_whisper"):
         try:
-            return importlib.import_module(name), name
+            return import_engine_module(name), name
         except Exception:
             continue
-    log("error", "no whisper module found. Install with: pip install -U openai-whisper whisperx faster-whisper")
+    log(LOG_ERROR, "no whisper module found. Install with: pip install -U openai-whisper whisperx faster-whisper")
     return None, None
 
 
-def load_audio_with_fallback(path):
+def resolve_load_audio():
     if base_whisper is not None and hasattr(base_whisper, "load_audio"):
-        return base_whisper.load_audio(path)
+        return base_whisper.load_audio
     for name in ("whisperx", "whisper"):
         try:
-            mod = importlib.import_module(name)
+            mod = import_engine_module(name)
         except Exception:
             continue
         if hasattr(mod, "load_audio"):
-            return mod.load_audio(path)
+            return mod.load_audio
     raise RuntimeError(
         "no whisper module with load_audio found. Install with: pip install -U openai-whisper whisperx"
     )
 
 
+def load_audio_with_fallback(path):
+    global _load_audio_fn
+    if _load_audio_fn is None:
+        _load_audio_fn = resolve_load_audio()
+    return _load_audio_fn(path)
+
+
 base_whisper, _whisper_module_name = detect_whisper_module()
 
+def json_dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        # The stdlib parser needs one str; decode it straight from the buffer
+        # rather than copying the bytes out first.
+        data = str(data, "utf-8")
+    return json.loads(data)
+
+
 def emit_stdout(payload):
     try:
-        sys.stdout.write(json.dumps(payload, ensure_ascii=False) + "\n")
-        sys.stdout.flush()
+        write_fd(STDOUT_FD, json_dumps(payload) + b"\n")
     except Exception:
         pass
 
 
 def resolve_device(device):
+    global _default_device
     if not device or device == "default":
-        try:
-            import torch  # type: ignore
+        # CUDA availability does not change for the life of the process.
+        if _default_device is None:
+            try:
+                import torch  # type: ignore
 
-            return "cuda" if torch.cuda.is_available() else "cpu"
-        except Exception:
-            return "cpu"
+                _default_device = "cuda" if torch.cuda.is_available() else "cpu"
+            except Exception:
+                _default_device = "cpu"
+        return _default_device
     if device == "gpu":
         return "cuda"
     if device == "cuda":
@@ -98,66 +234,208 @@ def resolve_device(device):
 
 
 def load_model_cached(model_name, device, compute_type, language, engine):
+    # Returns (model, inference_lock). openai-whisper and whisperx mutate the
+    # model object while transcribing, so each of their cache entries carries
+    # a lock callers must hold around inference; faster-whisper entries have
+    # None and run up to CT2_NUM_WORKERS requests at once inside CTranslate2
+    # (further requests queue there).
     resolved_device = resolve_device(device)
-    key = f"{engine}|{model_name}|{resolved_device}|{compute_type}|{language or ''}"
-    if key in model_cache:
-        return model_cache[key]
+    key = model_key(model_name, resolved_device, compute_type, language, engine)
+    # model_lock only guards the cache, so requests for cached models are not
+    # blocked by a load in progress. Loads run one at a time under _load_slot;
+    # a request that waited there re-checks the cache, since the load ahead of
+    # it may have been for the same key.
+    with model_lock:
+        entry = cache_lookup(key)
+    if entry is not None:
+        return entry
+    with _load_slot:
+        with model_lock:
+            entry = cache_lookup(key)
+        if entry is None:
+            entry = load_model_entry(model_name, resolved_device, compute_type, language, engine, key)
+    return entry
+
+
+def model_key(model_name, resolved_device, compute_type, language, engine):
+    return (engine, model_name, resolved_device, compute_type, language or "")
+
+
+def load_model_entry(model_name, resolved_device, compute_type, language, engine, key):
+    # Caller holds _load_slot. A full cache gives up its least recently used
+    # model before the load starts, so a device that holds exactly
+    # MAX_CACHED_MODELS models can still switch to a new one.
+    with model_lock:
+        evict_cached_models(MAX_CACHED_MODELS - 1)
+    model = load_model(model_name, resolved_device, compute_type, language, engine, key)
+    entry = (model, None if engine == "faster-whisper" else threading.Lock())
+    with model_lock:
+        model_cache[key] = entry
+    return entry
+
+
+def format_model_key(key):
+    return "|".join(str(part) for part in key)
+
+
+def cache_lookup(key):
+    # Caller holds model_lock.
+    entry = model_cache.get(key)
+    if entry is not None:
+        model_cache.move_to_end(key)
+    return entry
+
+
+def evict_cached_models(limit):
+    # Caller holds model_lock. Requests still using an evicted model keep it
+    # alive until they finish; the cache just stops pinning it.
+    evicted = False
+    while len(model_cache) > limit:
+        key, evicted_entry = model_cache.popitem(last=False)
+        log(LOG_INFO, f"evicting cached model {format_model_key(key)}")
+        del evicted_entry
+        evicted = True
+    if evicted:
+        release_device_memory()
+
+
+def release_device_memory():
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return
+    try:
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception as exc:
+        log(LOG_DEBUG, f"cuda empty_cache failed: {exc}")
+
+
+def configure_torch_threads(engine):
+    # faster-whisper and whisperx run inference on CTranslate2's own thread
+    # pool; keep torch's intra-op pool from competing with it for the same
+    # cores. The setting is process-wide and openai-whisper infers on torch
+    # itself, so torch keeps its default while a whisper model is cached or
+    # loading. torch is only configured if an engine already imported it.
+    global _torch_default_threads
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return
+    try:
+        if _torch_default_threads is None:
+            _torch_default_threads = torch.get_num_threads()
+        with model_lock:
+            serves_whisper = engine == "whisper" or any(key[0] == "whisper" for key in model_cache)
+        target = _torch_default_threads if serves_whisper else TORCH_NUM_THREADS
+        if torch.get_num_threads() != target:
+            torch.set_num_threads(target)
+    except Exception as exc:
+        log(LOG_DEBUG, f"torch.set_num_threads failed: {exc}")
+
+
+def load_model(model_name, resolved_device, compute_type, language, engine, key):
     start = time.time()
     log(
-        "info",
+        LOG_INFO,
         f"loading engine={engine} model={model_name} device={resolved_device} compute={compute_type} lang={language}",
     )
     global last_error, last_load_model, last_load_ms, loading_model, loading_started_at
-    loading_model = key
+    loading_model = format_model_key(key)
     loading_started_at = start
     try:
         if engine == "whisper":
-            global whisper_module
-            if whisper_module is None:
-                whisper_module = importlib.import_module("whisper")
+            whisper_module = import_engine_module("whisper")
             if not hasattr(whisper_module, "load_model"):
                 module_path = getattr(whisper_module, "__file__", "unknown")
                 raise RuntimeError(
                     f"whisper module missing load_model (module path: {module_path}). "
                     "Install OpenAI Whisper: pip install -U openai-whisper"
                 )
-            model = whisper_module.load_model(model_name, device=resolved_device)
+            configure_torch_threads(engine)
+            load_kwargs = {"download_root": MODEL_DIR} if MODEL_DIR else {}
+            model = whisper_module.load_model(model_name, device=resolved_device, **load_kwargs)
         elif engine == "faster-whisper":
             try:
-                faster_whisper = importlib.import_module("faster_whisper")
+                faster_whisper = import_engine_module("faster_whisper")
             except Exception as exc:
                 raise RuntimeError(
                     "faster-whisper not installed. Install with: pip install -U faster-whisper"
                 ) from exc
-            model = faster_whisper.WhisperModel(model_name, device=resolved_device, compute_type=compute_type)
+            configure_torch_threads(engine)
+            model = faster_whisper.WhisperModel(
+                model_name,
+                device=resolved_device,
+                compute_type=compute_type,
+                cpu_threads=CT2_CPU_THREADS,
+                num_workers=CT2_NUM_WORKERS,
+                download_root=MODEL_DIR,
+            )
         else:
             try:
-                whisperx = importlib.import_module("whisperx")
+                whisperx = import_engine_module("whisperx")
             except Exception as exc:
                 raise RuntimeError(
                     "whisperx not installed. Install with: pip install -U whisperx"
                 ) from exc
-            model = whisperx.load_model(model_name, device=resolved_device, compute_type=compute_type, language=language)
+            configure_torch_threads(engine)
+            load_params = inspect.signature(whisperx.load_model).parameters
+            load_kwargs = {}
+            if "threads" in load_params:
+                load_kwargs["threads"] = CT2_CPU_THREADS
+            if MODEL_DIR and "download_root" in load_params:
+                load_kwargs["download_root"] = MODEL_DIR
+            model = whisperx.load_model(
+                model_name, device=resolved_device, compute_type=compute_type, language=language, **load_kwargs
+            )
     except Exception as exc:
         last_error = f"model load failed: {exc}"
-        log("error", f"model load error: {exc}")
+        log(LOG_ERROR, f"model load error: {exc}")
         loading_model = None
         loading_started_at = None
         raise
     elapsed_ms = int((time.time() - start) * 1000)
-    last_load_model = key
+    last_load_model = format_model_key(key)
     last_load_ms = elapsed_ms
+    log(LOG_INFO, f"model loaded engine={engine} model={model_name} device={resolved_device} ms={elapsed_ms}")
+    # Warm up before clearing the loading state so /status keeps reporting
+    # the model as loading until it is actually ready to serve.
+    if WARMUP_INFER and resolved_device == "cuda":
+        warm_up_inference(model, engine)
     loading_model = None
     loading_started_at = None
-    log("info", f"model loaded engine={engine} model={model_name} device={resolved_device} ms={elapsed_ms}")
-    model_cache[key] = model
     return model
 
 
+def warm_up_inference(model, engine):
+    # The first CUDA transcribe pays for cuDNN autotuning and allocator
+    # growth; run it on one second of silence at load time instead.
+    # whisperx is skipped: its VAD finds no speech in silence, so the encoder
+    # never runs, and transcribe pins the shared pipeline's tokenizer to the
+    # warmup language, which would disable auto-detection for later requests.
+    if engine == "whisperx":
+        return
+    start = time.time()
+    try:
+        import numpy as np  # type: ignore
+
+        silent = np.zeros(WARMUP_SAMPLES, dtype=np.float32)
+        if engine == "faster-whisper":
+            segments_iter, info = model.transcribe(silent, language="en")
+            for _seg in segments_iter:
+                pass
+        else:
+            model.transcribe(silent, language="en")
+    except Exception as exc:
+        log(LOG_ERROR, f"warmup inference failed engine={engine}: {exc}")
+        return
+    log(LOG_INFO, f"warmup inference done engine={engine} ms={int((time.time() - start) * 1000)}")
+
+
 def status_payload():
     return {
         "ok": True,
-        "cached_models": list(model_cache.keys()),
+        "cached_models": [format_model_key(key) for key in list(model_cache)],
+        "cached_models_count": len(model_cache),
+        "max_cached_models": MAX_CACHED_MODELS,
         "last_error": last_error,
         "last_load_model": last_load_model,
         "last_load_ms": last_load_ms,
@@ -167,149 +445,368 @@ def status_payload():
     }
 
 
+def model_options(payload):
+    return (
+        payload.get("model", "small"),
+        resolve_device(payload.get("device", "default")),
+        payload.get("compute_type", "int8"),
+        payload.get("language"),
+        payload.get("engine", "whisperx"),
+    )
+
+
 def warmup_payload(payload):
-    engine = payload.get("engine", "whisperx")
-    model_name = payload.get("model", "small")
-    language = payload.get("language")
-    compute_type = payload.get("compute_type", "int8")
-    device = resolve_device(payload.get("device", "default"))
-    with model_lock:
-        load_model_cached(model_name, device, compute_type, language, engine)
+    load_model_cached(*model_options(payload))
     return {"ok": True}
 
 
+def preload_payload(payload):
+    models = payload.get("models") or []
+    if not isinstance(models, list):
+        raise RuntimeError("models must be a list")
+    # Every entry gets a result in request order. Loading stops once the cache
+    # holds as many distinct preloaded models as it can keep, since more would
+    # just evict each other; failed and duplicate entries do not count.
+    results = []
+    loaded = set()
+    for entry in models:
+        if not isinstance(entry, dict):
+            results.append({"engine": None, "model": None, "ok": False, "error": "invalid entry: expected an object"})
+            continue
+        item = {"engine": entry.get("engine", "whisperx"), "model": entry.get("model", "small"), "ok": True}
+        results.append(item)
+        try:
+            options = model_options(entry)
+            key = model_key(*options)
+            if key not in loaded and len(loaded) >= MAX_CACHED_MODELS:
+                item["ok"] = False
+                item["error"] = f"skipped: cache capacity (TRANSCRIBER_MAX_CACHED_MODELS={MAX_CACHED_MODELS})"
+                continue
+            load_model_cached(*options)
+        except Exception as exc:
+            item["ok"] = False
+            item["error"] = f"model load failed: {exc}"
+            continue
+        loaded.add(key)
+    return {"ok": all(item["ok"] for item in results), "results": results}
+
+
+def segments_text(segments):
+    return " ".join([seg.get("text", "").strip() for seg in segments]).strip()
+
+
+def prompt_kwarg_name(model):
+    # Keyed by model type rather than id() so an evicted model's id being
+    # reused by a new object cannot return a stale answer.
+    model_type = type(model)
+    if model_type in _prompt_kw_cache:
+        return _prompt_kw_cache[model_type]
+    prompt_kw = None
+    try:
+        params = inspect.signature(model.transcribe).parameters
+        if "initial_prompt" in params:
+            prompt_kw = "initial_prompt"
+        elif "prompt" in params:
+            prompt_kw = "prompt"
+    except Exception:
+        pass
+    _prompt_kw_cache[model_type] = prompt_kw
+    return prompt_kw
+
+
+def write_base64_to_file(f, audio_b64):
+    # Decode in slices so the full audio never sits in memory next to its
+    # base64 form. The app's client never line-wraps, so aligned slices are
+    # decoded directly; if one is rejected, start over on a path that drops
+    # characters outside the alphabet (e.g. MIME line wraps), as one-shot
+    # b64decode does, and carries any partial quantum into the next slice.
+    start = f.tell()
+    try:
+        for i in range(0, len(audio_b64), BASE64_CHUNK_CHARS):
+            f.write(pybase64.b64decode(audio_b64[i : i + BASE64_CHUNK_CHARS], validate=True))
+        return
+    except ValueError:
+        f.seek(start)
+        f.truncate()
+    pending = ""
+    for i in range(0, len(audio_b64), BASE64_CHUNK_CHARS):
+        chunk = pending + BASE64_JUNK_RE.sub("", audio_b64[i : i + BASE64_CHUNK_CHARS])
+        usable = len(chunk) - len(chunk) % 4
+        pending = chunk[usable:]
+        f.write(pybase64.b64decode(chunk[:usable], validate=False))
+    if pending:
+        f.write(pybase64.b64decode(pending, validate=False))
+
+
+def acquire_temp_audio(extension):
+    # Reusable audio files inside a private directory, instead of a fresh
+    # NamedTemporaryFile per request. Free files wait in a small per-extension
+    # pool; acquire never hands the same file to two requests at once.
+    global _tmp_dir
+    if not TEMP_EXTENSION_RE.match(extension or ""):
+        extension = ".webm"
+    with _tmp_paths_lock:
+        # tmp cleaners remove idle directories under /tmp while the app stays
+        # up for days; start a new one, and drop the pooled paths with it.
+        if _tmp_dir is None or not os.path.isdir(_tmp_dir):
+            _tmp_dir = tempfile.mkdtemp(prefix=f"transcriber_{os.getpid()}_")
+            _tmp_free.clear()
+        free = _tmp_free.get(extension)
+        if free:
+            return free.pop()
+        return os.path.join(_tmp_dir, f"audio_{next(_tmp_counter)}{extension}")
+
+
+def release_temp_audio(path):
+    # Drop the recording as soon as the request is done; only an empty file
+    # is kept for reuse, and files beyond the pool size are removed.
+    extension = os.path.splitext(path)[1]
+    try:
+        os.truncate(path, 0)
+    except OSError:
+        pass
+    with _tmp_paths_lock:
+        free = _tmp_free.setdefault(extension, [])
+        if len(free) < TEMP_POOL_SIZE:
+            free.append(path)
+            return
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def cleanup_temp_audio():
+    if _tmp_dir is not None:
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+atexit.register(cleanup_temp_audio)
+
+
+def write_temp_audio(extension, write):
+    # The caller must pass the returned path to release_temp_audio.
+    path = acquire_temp_audio(extension)
+    # A path that cannot be opened is not returned to the pool.
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+    except Exception:
+        release_temp_audio(path)
+        raise
+    return path
+
+
+def transcribe_path(payload):
+    # Only reachable from run_stdio: the parent process that spawned the
+    # worker may point it at local files, HTTP clients may not.
+    audio_path = payload.get("path")
+    if not os.path.isfile(audio_path):
+        raise RuntimeError(f"audio file not found: {audio_path}")
+    return transcribe_file(audio_path, payload)
+
+
 def transcribe_payload(payload):
-    global last_error, last_transcribe_ms
     audio_b64 = payload.get("audio_base64")
     if not audio_b64:
         raise RuntimeError("missing audio_base64")
+    try:
+        tmp_path = write_temp_audio(
+            payload.get("extension", ".webm"), lambda f: write_base64_to_file(f, audio_b64)
+        )
+    except (TypeError, ValueError) as exc:
+        # Decoder errors (binascii.Error is a ValueError); filesystem errors
+        # keep their own message.
+        raise RuntimeError(f"invalid base64: {exc}")
+    try:
+        return transcribe_file(tmp_path, payload)
+    finally:
+        release_temp_audio(tmp_path)
+
+
+def run_whisper(model, audio_path, opts):
+    # Each runner returns (result, retry); retry re-runs without the language
+    # hint, or is None when no language was given.
+    kwargs = {"fp16": opts["device"] != "cpu", "vad_filter": True}
+    if opts["initial_prompt"]:
+        kwargs["initial_prompt"] = opts["initial_prompt"]
+    language = opts["language"]
+    if not language:
+        return model.transcribe(audio_path, **kwargs), None
+    result = model.transcribe(audio_path, language=language, **kwargs)
+    return result, lambda: model.transcribe(audio_path, **kwargs)
+
+
+def run_faster_whisper(model, audio_path, opts):
+    segments_iter, info = model.transcribe(
+        audio_path,
+        language=opts["language"] or None,
+        initial_prompt=opts["initial_prompt"] or None,
+        vad_filter=True,
+    )
+    segments_list = []
+    text_parts = []
+    for seg in segments_iter:
+        seg_text = seg.text
+        # faster-whisper already yields Python floats for start/end.
+        segments_list.append({"start": seg.start, "end": seg.end, "text": seg_text})
+        seg_text = seg_text.strip()
+        if seg_text:
+            text_parts.append(seg_text)
+    return {"text": " ".join(text_parts), "segments": segments_list}, None
+
+
+def run_whisperx(model, audio_path, opts):
+    audio = load_audio_with_fallback(audio_path)
+    kwargs = {"batch_size": opts["batch_size"], "vad_filter": True}
+    if opts["initial_prompt"]:
+        prompt_kw = prompt_kwarg_name(model)
+        if prompt_kw:
+            kwargs[prompt_kw] = opts["initial_prompt"]
+    language = opts["language"]
+    result = model.transcribe(audio, language=language, **kwargs)
+    if not language:
+        return result, None
+    return result, lambda: model.transcribe(audio, **kwargs)
+
+
+_ENGINE_RUNNERS = {
+    "whisper": run_whisper,
+    "faster-whisper": run_faster_whisper,
+    "whisperx": run_whisperx,
+}
+
+
+def transcribe_file(audio_path, payload):
+    global last_error, last_transcribe_ms
     engine = payload.get("engine", "whisperx")
     model_name = payload.get("model", "small")
     language = payload.get("language")
     compute_type = payload.get("compute_type", "int8")
-    batch_size = int(payload.get("batch_size", 4))
-    initial_prompt = payload.get("initial_prompt")
     device = resolve_device(payload.get("device", "default"))
+    opts = {
+        "language": language,
+        "initial_prompt": payload.get("initial_prompt"),
+        "batch_size": int(payload.get("batch_size", 4)),
+        "device": device,
+    }
+    runner = _ENGINE_RUNNERS.get(engine, run_whisperx)
 
+    model, inference_lock = load_model_cached(model_name, device, compute_type, language, engine)
     try:
-        audio_bytes = base64.b64decode(audio_b64)
-    except Exception as exc:
-        raise RuntimeError(f"invalid base64: {exc}")
-
-    with model_lock:
-        model = load_model_cached(model_name, device, compute_type, language, engine)
-        tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=payload.get("extension", ".webm"))
-        try:
-            tmp_file.write(audio_bytes)
-            tmp_file.flush()
-            tmp_path = tmp_file.name
-        finally:
-            tmp_file.close()
-
-        try:
-            start_time = time.time()
+        start_time = time.time()
+        if INFO_ENABLED:
             log(
-                "info",
-                f"transcribe start engine={engine} model={model_name} device={device} lang={language} compute={compute_type} bytes={len(audio_bytes)}",
+                LOG_INFO,
+                f"transcribe start engine={engine} model={model_name} device={device} lang={language} compute={compute_type} bytes={os.path.getsize(audio_path)}",
             )
-            if engine == "whisper":
-                kwargs = {
-                    "language": language,
-                    "initial_prompt": initial_prompt,
-                    "fp16": device != "cpu",
-                    "vad_filter": True,
-                }
-                kwargs = {k: v for k, v in kwargs.items() if v is not None and v != ""}
-                result = model.transcribe(tmp_path, **kwargs)
-            elif engine == "faster-whisper":
-                kwargs = {
-                    "language": language or None,
-                    "initial_prompt": initial_prompt or None,
-                    "vad_filter": True,
-                }
-                segments_iter, info = model.transcribe(tmp_path, **kwargs)
-                segments_list = []
-                for seg in segments_iter:
-                    segments_list.append(
-                        {
-                            "start": float(seg.start),
-                            "end": float(seg.end),
-                            "text": seg.text,
-                        }
-                    )
-                result = {
-                    "text": " ".join(s["text"].strip() for s in segments_list).strip(),
-                    "segments": segments_list,
-                }
-            else:
-                audio = load_audio_with_fallback(tmp_path)
-                kwargs = {
-                    "batch_size": batch_size,
-                    "language": language,
-                    "vad_filter": True,
-                }
-                if initial_prompt:
-                    try:
-                        import inspect
-
-                        sig = inspect.signature(model.transcribe)
-                        if "initial_prompt" in sig.parameters:
-                            kwargs["initial_prompt"] = initial_prompt
-                        elif "prompt" in sig.parameters:
-                            kwargs["prompt"] = initial_prompt
-                    except Exception:
-                        pass
-                result = model.transcribe(audio, **kwargs)
+        with inference_lock or nullcontext():
+            result, retry = runner(model, audio_path, opts)
 
             text = (result or {}).get("text", "") or ""
             segments = (result or {}).get("segments", []) or []
             if not text and segments:
                 try:
-                    text = " ".join(seg.get("text", "").strip() for seg in segments).strip()
+                    text = segments_text(segments)
                 except Exception:
                     text = ""
-            if not text and language and engine != "faster-whisper":
-                retry_kwargs = dict(kwargs)
-                retry_kwargs.pop("language", None)
+            if not text and retry is not None:
                 try:
-                    if engine == "whisper":
-                        result = model.transcribe(tmp_path, **retry_kwargs)
-                    else:
-                        result = model.transcribe(audio, **retry_kwargs)
+                    result = retry()
                     text = (result or {}).get("text", "") or ""
                     segments = (result or {}).get("segments", []) or []
                     if not text and segments:
-                        text = " ".join(seg.get("text", "").strip() for seg in segments).strip()
+                        text = segments_text(segments)
                 except Exception:
                     pass
 
-            elapsed_ms = int((time.time() - start_time) * 1000)
-            last_transcribe_ms = elapsed_ms
-            log("info", f"transcribe done ms={elapsed_ms} segments={len(segments)} text_len={len(text)}")
-            return {
-                "ok": True,
-                "result": {"text": text, "segments": segments, "segments_len": len(segments)},
-            }
-        except Exception as exc:
-            last_error = f"transcribe failed: {exc}"
-            log("error", f"transcribe error: {exc}")
-            return {"ok": False, "error": f"transcribe failed: {exc}"}
-        finally:
-            try:
-                os.unlink(tmp_path)
-            except Exception:
-                pass
+        elapsed_ms = int((time.time() - start_time) * 1000)
+        last_transcribe_ms = elapsed_ms
+        if INFO_ENABLED:
+            log(LOG_INFO, f"transcribe done ms={elapsed_ms} segments={len(segments)} text_len={len(text)}")
+        return {
+            "ok": True,
+            "result": {"text": text, "segments": segments, "segments_len": len(segments)},
+        }
+    except Exception as exc:
+        last_error = f"transcribe failed: {exc}"
+        log(LOG_ERROR, f"transcribe error: {exc}")
+        return {"ok": False, "error": f"transcribe failed: {exc}"}
 
 
 class WhisperXHandler(BaseHTTPRequestHandler):
-    def _json_response(self, status, payload):
-        body = json.dumps(payload).encode("utf-8")
+    # HTTP/1.1 keeps client connections open between requests; idle ones are
+    # dropped after `timeout` seconds so they do not pin a server thread.
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT_S
+
+    def _json_response(self, status, payload, close=False):
+        # Pass close=True when the request body was not fully read, since the
+        # leftover bytes would be parsed as the next request.
+        body = json_dumps(payload)
         self.send_response(status)
         self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", str(len(body)))
+        # A client that asked for Connection: close has already set
+        # close_connection; send_header("Connection", "keep-alive") would
+        # clear it again.
+        if close or self.close_connection:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        else:
+            self.send_header("Connection", "keep-alive")
         self.end_headers()
         self.wfile.write(body)
 
+    def _copy_body(self, length, dest):
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(BODY_READ_CHUNK_BYTES, remaining))
+            if not chunk:
+                raise ValueError(f"body truncated: {length - remaining} of {length} bytes")
+            dest.write(chunk)
+            remaining -= len(chunk)
+
+    def _load_json_body(self, length):
+        if length <= BODY_SPOOL_MAX_BYTES:
+            return json_loads(self.rfile.read(length))
+        # Large bodies (base64 audio) are spooled to disk and parsed from an
+        # mmap. orjson reads the mapping directly, so the raw body never lands
+        # on the heap; without orjson the whole body is still decoded into one
+        # str before parsing.
+        with tempfile.TemporaryFile() as spool:
+            self._copy_body(length, spool)
+            spool.flush()
+            if spool.tell() == 0:
+                raise ValueError("empty body")
+            with mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    return json_loads(view)
+
+    def _raw_params(self, query):
+        params = parse_qs(query)
+        payload = {}
+        for field in RAW_PARAM_FIELDS:
+            if field in params:
+                payload[field] = params[field][-1]
+                continue
+            # Header values are percent-encoded so non-ASCII prompts survive.
+            header = self.headers.get("X-" + field.replace("_", "-"))
+            if header is not None:
+                payload[field] = unquote(header)
+        if "extension" not in payload:
+            content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip()
+            if content_type.startswith("audio/") and len(content_type) > len("audio/"):
+                payload["extension"] = "." + content_type[len("audio/") :]
+        return payload
+
+    def _transcribe_response(self, result):
+        if not result.get("ok"):
+            self._json_response(500, {"error": result.get("error", "transcribe failed")})
+            return
+        self._json_response(200, result.get("result", {}))
+
     def do_GET(self):
         if self.path == "/health":
             self._json_response(200, {"ok": True})
@@ -320,22 +817,50 @@ class WhisperXHandler(BaseHTTPRequestHandler):
         self._json_response(404, {"error": "not found"})
 
     def do_POST(self):
-        if self.path not in ("/transcribe", "/warmup"):
-            self._json_response(404, {"error": "not found"})
+        url = urlsplit(self.path)
+        if url.path not in ("/transcribe", "/transcribe_raw", "/warmup", "/preload"):
+            self._json_response(404, {"error": "not found"}, close=True)
             return
 
-        length = int(self.headers.get("Content-Length", "0"))
-        if length <= 0:
+        # Without a usable Content-Length (e.g. a chunked body) the body cannot
+        # be skipped, so close rather than parse it as the next request.
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            length = -1
+        if length < 0 or self.headers.get("Transfer-Encoding"):
+            self._json_response(411, {"error": "Content-Length required"}, close=True)
+            return
+        if length == 0:
             self._json_response(400, {"error": "empty body"})
             return
-        raw = self.rfile.read(length)
+
+        if url.path == "/transcribe_raw":
+            payload = self._raw_params(url.query)
+            try:
+                tmp_path = write_temp_audio(
+                    payload.get("extension", ".webm"), lambda f: self._copy_body(length, f)
+                )
+            except Exception as exc:
+                self._json_response(400, {"error": f"invalid body: {exc}"}, close=True)
+                return
+            try:
+                result = transcribe_file(tmp_path, payload)
+            except Exception as exc:
+                self._json_response(500, {"error": f"transcribe failed: {exc}"})
+                return
+            finally:
+                release_temp_audio(tmp_path)
+            self._transcribe_response(result)
+            return
+
         try:
-            payload = json.loads(raw.decode("utf-8"))
+            payload = self._load_json_body(length)
         except Exception as exc:
             self._json_response(400, {"error": f"invalid json: {exc}"})
             return
 
-        if self.path == "/warmup":
+        if url.path == "/warmup":
             try:
                 result = warmup_payload(payload)
             except Exception as exc:
@@ -344,34 +869,43 @@ class WhisperXHandler(BaseHTTPRequestHandler):
             self._json_response(200, result)
             return
 
+        if url.path == "/preload":
+            try:
+                result = preload_payload(payload)
+            except Exception as exc:
+                self._json_response(500, {"error": f"preload failed: {exc}"})
+                return
+            self._json_response(200, result)
+            return
+
+        if "path" in payload:
+            self._json_response(400, {"error": "path is only accepted over stdio"})
+            return
         try:
             result = transcribe_payload(payload)
         except Exception as exc:
             self._json_response(500, {"error": f"transcribe failed: {exc}"})
             return
-        if not result.get("ok"):
-            self._json_response(500, {"error": result.get("error", "transcribe failed")})
-            return
-        self._json_response(200, result.get("result", {}))
+        self._transcribe_response(result)
 
 
 def run_stdio():
-    log("info", "stdio mode ready")
+    log(LOG_INFO, "stdio mode ready")
     emit_stdout({"type": "ready"})
     for raw_line in sys.stdin:
         line = raw_line.strip()
         if not line:
             continue
         try:
-            msg = json.loads(line)
+            msg = json_loads(line)
         except Exception as exc:
-            log("error", f"invalid json: {exc}")
+            log(LOG_ERROR, f"invalid json: {exc}")
             continue
         msg_id = msg.get("id")
         msg_type = msg.get("type")
         payload = msg.get("payload") or {}
         if msg_id is None:
-            log("error", "missing id in message")
+            log(LOG_ERROR, "missing id in message")
             continue
         if msg_type == "status":
             emit_stdout({"id": msg_id, "ok": True, "result": status_payload()})
@@ -384,9 +918,20 @@ def run_stdio():
                 continue
             emit_stdout({"id": msg_id, "ok": True, "result": result})
             continue
+        if msg_type == "preload":
+            try:
+                result = preload_payload(payload)
+            except Exception as exc:
+                emit_stdout({"id": msg_id, "ok": False, "error": f"preload failed: {exc}"})
+                continue
+            emit_stdout({"id": msg_id, "ok": True, "result": result})
+            continue
         if msg_type == "transcribe":
             try:
-                result = transcribe_payload(payload)
+                if payload.get("path"):
+                    result = transcribe_path(payload)
+                else:
+                    result = transcribe_payload(payload)
             except Exception as exc:
                 emit_stdout({"id": msg_id, "ok": False, "error": f"transcribe failed: {exc}"})
                 continue
@@ -404,13 +949,15 @@ def main():
     parser.add_argument("--port", type=int, default=8765)
     parser.add_argument("--mode", default="http", choices=["http", "stdio"])
     args = parser.parse_args()
+    # The app stops the worker with SIGTERM; exit normally so atexit cleanup runs.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
     if args.mode == "stdio":
         run_stdio()
         return
 
-    server = HTTPServer((args.host, args.port), WhisperXHandler)
-    log("info", f"listening on {args.host}:{args.port}")
+    server = ThreadingHTTPServer((args.host, args.port), WhisperXHandler)
+    log(LOG_INFO, f"listening on {args.host}:{args.port}")
     try:
         server.serve_forever()
     except KeyboardInterrupt:
@@ -40,7 +40,7 @@ function main() {
 
   console.log('[bundle] installing python deps (faster-whisper only)');
   execFileSync(pip, ['install', '--upgrade', 'pip', 'setuptools', 'wheel'], { stdio: 'inherit' });
-  execFileSync(pip, ['install', 'faster-whisper'], { stdio: 'inherit' });
+  execFileSync(pip, ['install', 'faster-whisper', 'pybase64>=1.4', 'orjson'], { stdio: 'inherit' });
 
   const ffmpegPath = process.env.FFMPEG_PATH || resolveCommand('ffmpeg');
   if (!ffmpegPath) {
@@ -0,0 +1,161 @@
+import { EventEmitter } from 'node:events';
+import fs from 'node:fs';
+import http from 'node:http';
+import os from 'node:os';
+import path from 'node:path';
+import { afterEach, beforeEach, describe, expect, it, vi } from 'vitest';
+
+const { spawnMock, configRef, promptRef } = vi.hoisted(() => ({
+  spawnMock: vi.fn(),
+  configRef: {} as Record<string, any>,
+  promptRef: { value: '' }
+}));
+
+vi.mock('node:child_process', () => ({
+  spawn: spawnMock,
+  default: {
+    spawn: spawnMock
+  }
+}));
+
+vi.mock('../ctx.js', () => ({
+  config: configRef,
+  logger: null,
+  APP_ROOT: ''
+}));
+
+vi.mock('../resolve.js', () => ({
+  resolvePythonCommand: () => 'python3',
+  resolveWorkerScriptPath: () => '/tmp/worker.py',
+  buildWorkerEnv: () => ({})
+}));
+
+vi.mock('../transcript.js', () => ({
+  buildInitialPrompt: () => promptRef.value
+}));
+
+type Received = { url: string; headers: http.IncomingHttpHeaders; body: Buffer };
+
+function fakeWorkerProcess(): any {
+  const proc = new EventEmitter() as any;
+  proc.stdout = new EventEmitter();
+  proc.stderr = new EventEmitter();
+  proc.stdin = { writable: true, write: vi.fn() };
+  return proc;
+}
+
+async function startFakeHttpWorker(reply: string): Promise<{ server: http.Server; received: Received[] }> {
+  const received: Received[] = [];
+  const server = http.createServer((req, res) => {
+    const chunks: Buffer[] = [];
+    req.on('data', (chunk: Buffer) => chunks.push(chunk));
+    req.on('end', () => {
+      if (req.url === '/health') { res.end('{"ok":true}'); return; }
+      received.push({ url: req.url || '', headers: req.headers, body: Buffer.concat(chunks) });
+      // Split the reply inside a multi-byte character to exercise decoding.
+      const bytes = Buffer.from(reply, 'utf8');
+      const cut = bytes.indexOf(0xc3) + 1;
+      res.writeHead(200, { 'Content-Type': 'application/json' });
+      res.write(bytes.subarray(0, cut));
+      setTimeout(() => res.end(bytes.subarray(cut)), 10);
+    });
+  });
+  await new Promise<void>((resolve) => server.listen(0, '127.0.0.1', resolve));
+  configRef.workerPort = (server.address() as any).port;
+  return { server, received };
+}
+
+let tmpDir = '';
+let audioPath = '';
+let server: http.Server | null = null;
+const audio = Buffer.from([0, 1, 2, 250, 251, 252, 253, 254, 255]);
+
+beforeEach(() => {
+  vi.resetModules();
+  spawnMock.mockReset();
+  for (const key of Object.keys(configRef)) delete configRef[key];
+  Object.assign(configRef, {
+    useWorker: true,
+    workerTransport: 'http',
+    workerHost: '127.0.0.1',
+    workerPort: 0,
+    workerStartupTimeoutMs: 5000,
+    workerRequestTimeoutMs: 5000,
+    asrEngine: 'faster-whisper',
+    model: 'small',
+    language: 'pt',
+    computeType: 'int8',
+    batchSize: 4,
+    device: 'cpu'
+  });
+  promptRef.value = 'Glossário: João, ação';
+  tmpDir = fs.mkdtempSync(path.join(os.tmpdir(), 'worker-manager-test-'));
+  audioPath = path.join(tmpDir, 'clip.webm');
+  fs.writeFileSync(audioPath, audio);
+});
+
+afterEach(async () => {
+  if (server) await new Promise((resolve) => server!.close(resolve));
+  server = null;
+  fs.rmSync(tmpDir, { recursive: true, force: true });
+});
+
+describe('transcribeViaWorker', () => {
+  it('streams raw audio over http with the prompt in a percent-encoded header', async () => {
+    spawnMock.mockImplementation(() => fakeWorkerProcess());
+    const worker = await startFakeHttpWorker(JSON.stringify({ text: 'olá ação' }));
+    server = worker.server;
+    const { transcribeViaWorker } = await import('../worker-manager.js');
+
+    await expect(transcribeViaWorker(audioPath)).resolves.toBe('olá ação');
+
+    const [request] = worker.received;
+    const url = new URL(request.url, 'http://worker');
+    expect(url.pathname).toBe('/transcribe_raw');
+    expect(url.searchParams.get('engine')).toBe('faster-whisper');
+    expect(url.searchParams.get('language')).toBe('pt');
+    expect(url.searchParams.has('initial_prompt')).toBe(false);
+    expect(decodeURIComponent(String(request.headers['x-initial-prompt']))).toBe(promptRef.value);
+    expect(request.headers['content-type']).toBe('audio/webm');
+    expect(request.body.equals(audio)).toBe(true);
+  });
+
+  it('falls back to the JSON endpoint when the prompt is too long for a header', async () => {
+    spawnMock.mockImplementation(() => fakeWorkerProcess());
+    const worker = await startFakeHttpWorker(JSON.stringify({ text: 'longo ção' }));
+    server = worker.server;
+    promptRef.value = 'ação, '.repeat(20000);
+    const { transcribeViaWorker } = await import('../worker-manager.js');
+
+    await expect(transcribeViaWorker(audioPath)).resolves.toBe('longo ção');
+
+    const [request] = worker.received;
+    expect(request.url).toBe('/transcribe');
+    const payload = JSON.parse(request.body.toString('utf8'));
+    expect(payload.initial_prompt).toBe(promptRef.value);
+    expect(Buffer.from(payload.audio_base64, 'base64').equals(audio)).toBe(true);
+    expect(payload.path).toBeUndefined();
+  });
+
+  it('passes the recording path over stdio instead of the audio bytes', async () => {
+    configRef.workerTransport = 'stdio';
+    const proc = fakeWorkerProcess();
+    proc.stdin.write.mockImplementation((line: string) => {
+      const msg = JSON.parse(line);
+      queueMicrotask(() => proc.stdout.emit('data', Buffer.from(`${JSON.stringify({ id: msg.id, ok: true, result: { text: 'pronto' } })}\n`)));
+    });
+    spawnMock.mockImplementation(() => {
+      setTimeout(() => proc.stdout.emit('data', Buffer.from('{"type":"ready"}\n')), 0);
+      return proc;
+    });
+    const { transcribeViaWorker } = await import('../worker-manager.js');
+
+    await expect(transcribeViaWorker(audioPath)).resolves.toBe('pronto');
+
+    const message = JSON.parse(proc.stdin.write.mock.calls[0][0]);
+    expect(message.type).toBe('transcribe');
+    expect(message.payload.path).toBe(audioPath);
+    expect(message.payload.audio_base64).toBeUndefined();
+    expect(message.payload.initial_prompt).toBe(promptRef.value);
+  });
+});
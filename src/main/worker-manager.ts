@@ -19,6 +19,9 @@ let workerMsgId = 0;
 let workerStdioReadyPromise: Promise<boolean> | null = null;
 
 // ── Transport helpers ─────────────────────────────────────────────────────────
+// Header values sent to the worker stay well under http.server's 64 KiB line cap.
+const MAX_WORKER_HEADER_CHARS = 60000;
+
 function getWorkerTransport(): 'stdio' | 'http' {
   const v = config?.workerTransport ? String(config.workerTransport).toLowerCase() : 'http';
   return v === 'stdio' ? 'stdio' : 'http';
@@ -157,9 +160,8 @@ export function ensureWorker(): Promise<boolean> {
 export async function transcribeViaWorker(audioPath: string): Promise<string | null> {
   const ok = await ensureWorker();
   if (!ok) return null;
-  const payload = {
+  const params: Record<string, any> = {
     engine: config.asrEngine || 'whisperx',
-    audio_base64: fs.readFileSync(audioPath).toString('base64'),
     extension: path.extname(audioPath),
     model: config.model, language: config.language,
     compute_type: config.computeType, batch_size: config.batchSize,
@@ -167,21 +169,53 @@ export async function transcribeViaWorker(audioPath: string): Promise<string | n
     device: config.device || 'default'
   };
   if (getWorkerTransport() === 'stdio') {
-    const result: any = await sendWorkerMessage('transcribe', payload, config.workerRequestTimeoutMs || 30000);
+    // The worker is a local child process, so it can read the recording directly.
+    const result: any = await sendWorkerMessage('transcribe', { ...params, path: audioPath }, config.workerRequestTimeoutMs || 30000);
     return result?.text || '';
   }
-  const body = JSON.stringify(payload);
+  const { initial_prompt: initialPrompt, ...options } = params;
+  const query = new URLSearchParams();
+  for (const [key, value] of Object.entries(options)) {
+    if (value !== undefined && value !== null && value !== '') query.set(key, String(value));
+  }
+  // The prompt carries the whole dictionary, so it goes in a header rather than
+  // the request line; both are capped at 64 KiB by http.server.
+  const encodedPrompt = initialPrompt ? encodeURIComponent(initialPrompt) : '';
+  if (encodedPrompt.length > MAX_WORKER_HEADER_CHARS) {
+    // Too long for a header: fall back to the JSON endpoint.
+    const body = JSON.stringify({ ...params, audio_base64: fs.readFileSync(audioPath).toString('base64') });
+    return postToWorker('/transcribe', { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(body) },
+      (req) => { req.write(body); req.end(); });
+  }
+  const headers: Record<string, string | number> = {
+    'Content-Type': `audio/${path.extname(audioPath).slice(1) || 'webm'}`,
+    'Content-Length': fs.statSync(audioPath).size
+  };
+  if (encodedPrompt) headers['X-Initial-Prompt'] = encodedPrompt;
+  return postToWorker(`/transcribe_raw?${query.toString()}`, headers, (req) => {
+    const audio = fs.createReadStream(audioPath);
+    audio.on('error', (e) => req.destroy(e));
+    audio.pipe(req);
+  });
+}
+
+function postToWorker(
+  requestPath: string,
+  headers: Record<string, string | number>,
+  sendBody: (req: http.ClientRequest) => void
+): Promise<string> {
   return new Promise((resolve, reject) => {
     let statusTimer: any = null;
     const pollMs = config.workerStatusPollMs || 0;
     if (pollMs > 0) statusTimer = setInterval(() => fetchWorkerStatus('transcribe_wait'), pollMs);
     const req = http.request(
-      { host: config.workerHost, port: config.workerPort, path: '/transcribe', method: 'POST',
-        headers: { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(body) },
+      { host: config.workerHost, port: config.workerPort, path: requestPath, method: 'POST', headers,
         timeout: config.workerRequestTimeoutMs || 30000 },
       (res) => {
+        // The worker sends raw UTF-8; decode across chunk boundaries.
+        res.setEncoding('utf8');
         let data = '';
-        res.on('data', (c: any) => { data += c.toString('utf8'); });
+        res.on('data', (c: any) => { data += c; });
         res.on('end', () => {
           if (statusTimer) clearInterval(statusTimer);
           if (res.statusCode !== 200) { reject(new Error(`worker error ${res.statusCode}: ${data}`)); return; }
@@ -191,7 +225,7 @@ export async function transcribeViaWorker(audioPath: string): Promise<string | n
     );
     req.on('timeout', () => { if (statusTimer) clearInterval(statusTimer); req.destroy(new Error('worker request timeout')); });
     req.on('error', (e) => { if (statusTimer) clearInterval(statusTimer); reject(e); });
-    req.write(body); req.end();
+    sendBody(req);
   });
 }
 
@@ -274,8 +308,9 @@ export function fetchWorkerStatus(context = ''): void {
     return;
   }
   const req = http.get({ host: config.workerHost, port: config.workerPort, path: '/status', timeout: 2000 }, (res) => {
+    res.setEncoding('utf8');
     let data = '';
-    res.on('data', (c: any) => { data += c.toString('utf8'); });
+    res.on('data', (c: any) => { data += c; });
     res.on('end', () => {
       if (res.statusCode !== 200) { console.log('[worker] status error', context, res.statusCode, data); return; }
       try { logger?.info('[worker] status', context, JSON.stringify(JSON.parse(data))); }